@@ -15,12 +15,26 @@ Features:
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+import pyarrow as pa
 import json
+import math
+import re
+import threading
+from collections import deque
 from snowflake.snowpark.context import get_active_session
 from snowflake.snowpark.functions import col
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+# Numba is optional; trendline math falls back to NumPy when it is not installed
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # ============================================================================
 # Page Configuration
@@ -37,7 +51,9 @@ st.set_page_config(
 # Custom CSS for Professional UI
 # ============================================================================
 
-st.markdown("""
+# Only rules for classes the app renders are kept; this block is re-sent on
+# every rerun because Streamlit drops elements a run does not emit again.
+CUSTOM_CSS = """
 <style>
     /* Main title styling */
     .main-title {
@@ -53,54 +69,6 @@ st.markdown("""
         margin-bottom: 2rem;
     }
     
-    /* Chat message styling */
-    .user-message {
-        background-color: #e3f2fd;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border-left: 4px solid #1f77b4;
-    }
-    
-    .agent-message {
-        background-color: #f5f5f5;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border-left: 4px solid #4caf50;
-    }
-    
-    /* Metric cards */
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 1.5rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin: 0.5rem;
-    }
-    
-    .metric-value {
-        font-size: 2rem;
-        font-weight: 700;
-    }
-    
-    .metric-label {
-        font-size: 0.9rem;
-        opacity: 0.9;
-    }
-    
-    /* SQL code styling */
-    .sql-container {
-        background-color: #282c34;
-        color: #abb2bf;
-        padding: 1rem;
-        border-radius: 5px;
-        font-family: 'Courier New', monospace;
-        font-size: 0.9rem;
-        overflow-x: auto;
-    }
-    
     /* Button styling */
     .stButton>button {
         background-color: #1f77b4;
@@ -116,31 +84,20 @@ st.markdown("""
         background-color: #1565c0;
         box-shadow: 0 4px 8px rgba(0,0,0,0.2);
     }
-    
-    /* Sample questions styling */
-    .sample-question {
-        background-color: #fff3e0;
-        padding: 0.8rem;
-        border-radius: 5px;
-        margin: 0.5rem 0;
-        cursor: pointer;
-        border: 1px solid #ffb74d;
-        transition: all 0.2s;
-    }
-    
-    .sample-question:hover {
-        background-color: #ffe0b2;
-        border-color: #ff9800;
-    }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # ============================================================================
 # Session State Initialization
 # ============================================================================
 
+# Oldest messages are dropped once the history reaches this length
+MAX_HISTORY_MESSAGES = 20
+
 if 'messages' not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=MAX_HISTORY_MESSAGES)
 
 if 'current_data' not in st.session_state:
     st.session_state.current_data = None
@@ -148,6 +105,48 @@ if 'current_data' not in st.session_state:
 if 'current_sql' not in st.session_state:
     st.session_state.current_sql = None
 
+# ============================================================================
+# Sample Questions
+# ============================================================================
+
+SAMPLE_QUESTIONS = [
+    "Did an increase in scrolling lead to more vaccines administered?",
+    "Show the correlation between dwell time and preventative screenings",
+    "Which content topics drove the highest appointment show rates?",
+    "What is the relationship between engagement and provider churn?",
+    "Compare clinical outcomes across different medical specialties",
+    "Show me monthly trends in engagement and clinical outcomes",
+    "What outcomes do providers with high engagement achieve?",
+    "How do different regions compare in terms of engagement?",
+    "What content do we have about flu vaccines?",
+    "Find content about diabetes management"
+]
+
+# ============================================================================
+# Query Keywords
+# ============================================================================
+
+# Keywords that route a question to a visualization type, grouped by category
+QUERY_KEYWORDS = {
+    'viz': [
+        'impact', 'correlation', 'trend', 'compare', 'comparison',
+        'increase', 'decrease', 'lead to', 'relationship',
+        'show', 'visualize', 'plot', 'chart'
+    ],
+    'correlation': ['correlation', 'impact', 'lead to', 'relationship'],
+    'comparison': ['compare', 'comparison', 'across', 'by'],
+    'trend': ['trend', 'over time', 'monthly', 'quarterly']
+}
+
+# Column-name fragments used to pick chart axes, as regex alternations
+COLUMN_PATTERNS = {
+    'engagement': r'scroll|click|dwell|engagement',
+    'outcome': r'vaccine|screening|show_rate|appointment',
+    'categorical': r'specialty|region|level|category',
+    'time': r'month|quarter|year|date|time',
+    'metric': r'vaccine|screening|total|count'
+}
+
 # ============================================================================
 # Helper Functions
 # ============================================================================
@@ -157,6 +156,34 @@ def get_session():
     """Get Snowflake session"""
     return get_active_session()
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def _query_agent_cached(norm_query: str, _raw_query: str) -> dict:
+    """
+    Call the Cortex Agent and return its parsed response.
+    
+    Results are cached per normalized query so repeated questions skip the
+    Snowflake round-trip. Exceptions propagate and are therefore never cached.
+    
+    Args:
+        norm_query: Lowercased, stripped question used as the cache key
+        _raw_query: Question as typed, sent to the agent (excluded from the key
+            so literals like specialty or region names keep their case)
+        
+    Returns:
+        dict: Raw response from agent
+    """
+    session = get_session()
+    
+    # Call the Cortex Agent (bound parameter keeps the statement text stable)
+    result = session.sql(
+        "SELECT PATIENT_IMPACT_AGENT(?) AS response",
+        params=[_raw_query]
+    ).collect()
+    
+    # Parse JSON response
+    response_str = result[0]['RESPONSE']
+    return json.loads(response_str) if isinstance(response_str, str) else response_str
+
 def query_agent(user_query: str) -> dict:
     """
     Query the Cortex Agent with a natural language question.
@@ -167,17 +194,8 @@ def query_agent(user_query: str) -> dict:
     Returns:
         dict: Parsed response from agent
     """
-    session = get_session()
-    
     try:
-        # Call the Cortex Agent
-        result = session.sql(f"""
-            SELECT PATIENT_IMPACT_AGENT('{user_query.replace("'", "''")}') AS response
-        """).collect()
-        
-        # Parse JSON response
-        response_str = result[0]['RESPONSE']
-        response_dict = json.loads(response_str) if isinstance(response_str, str) else response_str
+        response_dict = _query_agent_cached(user_query.strip().lower(), user_query.strip())
         
         return {
             'status': 'success',
@@ -190,209 +208,363 @@ def query_agent(user_query: str) -> dict:
             'error': str(e)
         }
 
-def needs_visualization(query: str, response: dict) -> bool:
+@st.cache_resource
+def get_keyword_matcher():
+    """
+    Compile every query keyword into a single regex.
+    
+    The pattern is a zero-width lookahead so overlapping keywords are all
+    found in one left-to-right pass over the query.
+    
+    Returns:
+        tuple: Compiled pattern and a keyword -> categories lookup
+    """
+    keyword_categories = {}
+    for category, keywords in QUERY_KEYWORDS.items():
+        for keyword in keywords:
+            keyword_categories.setdefault(keyword, set()).add(category)
+    
+    alternation = '|'.join(
+        re.escape(keyword) for keyword in sorted(keyword_categories, key=len, reverse=True)
+    )
+    return re.compile(f"(?=({alternation}))"), keyword_categories
+
+def classify_query(query: str) -> set:
+    """
+    Find which keyword categories appear in a question.
+    
+    Args:
+        query: User's question
+        
+    Returns:
+        set: Matched category names from QUERY_KEYWORDS
+    """
+    pattern, keyword_categories = get_keyword_matcher()
+    
+    categories = set()
+    for match in pattern.finditer(query.lower()):
+        categories |= keyword_categories[match.group(1)]
+    return categories
+
+@st.cache_resource(show_spinner=False)
+def prewarm_agent_cache() -> threading.Thread:
+    """Warm the agent response cache for the sample questions in the background"""
+    def _warm():
+        for question in SAMPLE_QUESTIONS:
+            query_agent(question)
+    
+    thread = threading.Thread(target=_warm, daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+    return thread
+
+def needs_visualization(query: str, data: list) -> bool:
     """
     Determine if the query/response should trigger a visualization.
     
+    Runs before any DataFrame is built, using only the raw result rows, so
+    unplottable responses skip the visualization pipeline entirely.
+    
     Args:
         query: User's question
-        response: Agent response
+        data: List of dictionaries containing query results
         
     Returns:
         bool: True if visualization should be shown
     """
-    query_lower = query.lower()
+    # Need at least 2 rows for meaningful viz
+    if not data or len(data) < 2:
+        return False
+    
+    # Need at least one numeric column to plot, judged from the first row
+    has_numeric = any(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in data[0].values()
+    )
+    if not has_numeric:
+        return False
     
-    # Keywords that suggest visualization would be helpful
-    viz_keywords = [
-        'impact', 'correlation', 'trend', 'compare', 'comparison',
-        'increase', 'decrease', 'lead to', 'relationship',
-        'show', 'visualize', 'plot', 'chart'
+    # Check if query contains visualization keywords
+    return 'viz' in classify_query(query)
+
+def _linreg_numpy(x, y):
+    """Least-squares slope and intercept using vectorized NumPy operations"""
+    xm = x.mean()
+    ym = y.mean()
+    dx = x - xm
+    denom = (dx * dx).sum()
+    if denom == 0:
+        return math.nan, math.nan
+    slope = (dx * (y - ym)).sum() / denom
+    return slope, ym - slope * xm
+
+def _linreg_loop(x, y):
+    """Least-squares slope and intercept in two fused passes (Numba kernel)"""
+    n = x.size
+    sx = 0.0
+    sy = 0.0
+    for i in range(n):
+        sx += x[i]
+        sy += y[i]
+    xm = sx / n
+    ym = sy / n
+    num = 0.0
+    denom = 0.0
+    for i in range(n):
+        dx = x[i] - xm
+        num += dx * (y[i] - ym)
+        denom += dx * dx
+    if denom == 0.0:
+        return math.nan, math.nan
+    slope = num / denom
+    return slope, ym - slope * xm
+
+@st.cache_resource
+def get_linreg():
+    """Return the least-squares kernel, JIT-compiled with Numba when available"""
+    if njit is None:
+        return _linreg_numpy
+    
+    try:
+        return njit(cache=True)(_linreg_loop)
+    except RuntimeError:
+        # No writable location for Numba's on-disk cache; compile in memory only
+        return njit(_linreg_loop)
+
+def to_arrow_table(data: list):
+    """
+    Convert agent result rows into an Arrow table for st.dataframe.
+    
+    Arrow tables are sent to the browser without a pandas round-trip. Columns
+    are the union of keys across all rows (rows missing a key get nulls), as
+    with pd.DataFrame. Values Arrow cannot unify fall back to a DataFrame.
+    
+    Args:
+        data: List of dictionaries containing query results
+        
+    Returns:
+        pa.Table, or pd.DataFrame for mixed-type columns
+    """
+    # from_pylist would take the columns from the first row only
+    columns = list(dict.fromkeys(key for row in data for key in row))
+    try:
+        return pa.Table.from_pydict({
+            column: [row.get(column) for row in data] for column in columns
+        })
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pd.DataFrame.from_records(data)
+
+def _hash_dataframe(df: pd.DataFrame) -> tuple:
+    """Cheap content hash for DataFrame arguments of cached functions"""
+    return tuple(df.columns), pd.util.hash_pandas_object(df, index=False).values.tobytes()
+
+def _column_profile(df: pd.DataFrame) -> dict:
+    """Column-name and dtype buckets shared by the chart builders"""
+    # np.number also covers int32/float32
+    num_cols = df.select_dtypes(include=np.number).columns
+    return {
+        'lower': df.columns.astype(str).str.lower(),
+        'numeric': num_cols,
+        'numeric_set': set(num_cols),
+        'categorical': df.select_dtypes(include='object').columns
+    }
+
+def _build_scatter(df: pd.DataFrame, profile: dict) -> go.Figure:
+    """Scatter plot of engagement vs outcome for correlation/impact queries"""
+    cols_lower = profile['lower']
+    num_set = profile['numeric_set']
+    
+    # Try to identify x and y axes
+    engagement_cols = df.columns[cols_lower.str.contains(COLUMN_PATTERNS['engagement'])]
+    outcome_cols = df.columns[cols_lower.str.contains(COLUMN_PATTERNS['outcome'])]
+    
+    if not (len(engagement_cols) and len(outcome_cols)):
+        return None
+    
+    x_col = engagement_cols[0]
+    y_col = outcome_cols[0]
+    
+    # Check for categorical color column
+    color_cols = df.columns[cols_lower.str.contains(COLUMN_PATTERNS['categorical'])]
+    color_col = color_cols[0] if len(color_cols) else None
+    
+    fig = px.scatter(
+        df,
+        x=x_col,
+        y=y_col,
+        color=color_col,
+        size=y_col if y_col in num_set else None,
+        hover_data=df.columns.tolist(),
+        title=f"Impact of {x_col} on {y_col}",
+        labels={x_col: x_col.replace('_', ' ').title(), 
+               y_col: y_col.replace('_', ' ').title()},
+        template="plotly_white"
+    )
+    
+    # Add trendline
+    if x_col in num_set and y_col in num_set:
+        fig.update_traces(marker=dict(size=12, line=dict(width=1, color='white')))
+        
+        # Calculate and add regression line (closed-form least squares)
+        x = df[x_col].to_numpy(dtype=float)
+        y = df[y_col].to_numpy(dtype=float)
+        slope, intercept = get_linreg()(x, y)
+        if math.isfinite(slope):
+            xs = np.sort(x)
+            fig.add_trace(go.Scatter(
+                x=xs,
+                y=slope * xs + intercept,
+                mode='lines',
+                name='Trend',
+                line=dict(color='red', dash='dash', width=2)
+            ))
+    
+    return fig
+
+def _build_bar(df: pd.DataFrame, profile: dict) -> go.Figure:
+    """Bar chart of the most relevant metric by category for comparisons"""
+    cat_cols = profile['categorical']
+    num_cols = profile['numeric']
+    
+    if not (len(cat_cols) and len(num_cols)):
+        return None
+    
+    x_col = cat_cols[0]
+    # Choose the most relevant numeric column
+    metric_cols = df.columns[
+        profile['lower'].str.contains(COLUMN_PATTERNS['metric']) & df.columns.isin(num_cols)
     ]
+    y_col = metric_cols[0] if len(metric_cols) else num_cols[0]
+    
+    fig = px.bar(
+        df,
+        x=x_col,
+        y=y_col,
+        color=x_col,
+        title=f"{y_col.replace('_', ' ').title()} by {x_col.replace('_', ' ').title()}",
+        labels={x_col: x_col.replace('_', ' ').title(),
+               y_col: y_col.replace('_', ' ').title()},
+        template="plotly_white"
+    )
+    fig.update_layout(showlegend=False)
+    return fig
+
+def _build_line(df: pd.DataFrame, profile: dict) -> go.Figure:
+    """Multi-line chart of key metrics for trends over time"""
+    time_cols = df.columns[profile['lower'].str.contains(COLUMN_PATTERNS['time'])]
     
-    # Check if query contains visualization keywords
-    has_viz_keyword = any(keyword in query_lower for keyword in viz_keywords)
+    if not len(time_cols):
+        return None
     
-    # Check if response has data suitable for visualization
-    has_data = (
-        response.get('data') and 
-        len(response.get('data', [])) > 0 and
-        len(response.get('data', [])) > 1  # Need at least 2 rows for meaningful viz
+    x_col = time_cols[0]
+    
+    # Create multi-line chart for key metrics
+    fig = go.Figure()
+    
+    for col in profile['numeric'][:3]:  # Limit to 3 metrics for readability
+        fig.add_trace(go.Scatter(
+            x=df[x_col],
+            y=df[col],
+            mode='lines+markers',
+            name=col.replace('_', ' ').title(),
+            line=dict(width=3),
+            marker=dict(size=8)
+        ))
+    
+    fig.update_layout(
+        title="Trends Over Time",
+        xaxis_title=x_col.replace('_', ' ').title(),
+        yaxis_title="Value",
+        template="plotly_white",
+        hovermode='x unified'
     )
     
-    return has_viz_keyword and has_data
+    return fig
+
+def _build_default(df: pd.DataFrame, profile: dict) -> go.Figure:
+    """Simple bar chart with the first categorical and numeric columns"""
+    cat_cols = profile['categorical']
+    num_cols = profile['numeric']
+    
+    if not (len(cat_cols) and len(num_cols)):
+        # If all else fails, leave the data table as the only view
+        return None
+    
+    return px.bar(
+        df,
+        x=cat_cols[0],
+        y=num_cols[0],
+        title=f"Analysis Results",
+        template="plotly_white"
+    )
 
-def create_visualization(query: str, data: list) -> go.Figure:
+# Chart builder per query category, in priority order. A builder returns
+# None when the data lacks the columns it needs, passing to the next match.
+CHART_BUILDERS = {
+    'correlation': _build_scatter,
+    'comparison': _build_bar,
+    'trend': _build_line
+}
+
+@st.cache_data(
+    ttl=3600,
+    max_entries=100,
+    show_spinner=False,
+    hash_funcs={pd.DataFrame: _hash_dataframe}
+)
+def create_visualization(query: str, df: pd.DataFrame) -> go.Figure:
     """
     Create appropriate visualization based on query and data.
     
     Args:
         query: User's question
-        data: List of dictionaries containing query results
+        df: DataFrame containing query results
         
     Returns:
         Plotly figure object
     """
-    df = pd.DataFrame(data)
-    query_lower = query.lower()
-    
-    # Determine visualization type based on query and data structure
-    
-    # Scatter plot for correlation/impact queries
-    if any(keyword in query_lower for keyword in ['correlation', 'impact', 'lead to', 'relationship']):
-        # Try to identify x and y axes
-        engagement_cols = [col for col in df.columns if any(
-            term in col.lower() for term in ['scroll', 'click', 'dwell', 'engagement']
-        )]
-        outcome_cols = [col for col in df.columns if any(
-            term in col.lower() for term in ['vaccine', 'screening', 'show_rate', 'appointment']
-        )]
-        
-        if engagement_cols and outcome_cols:
-            x_col = engagement_cols[0]
-            y_col = outcome_cols[0]
-            
-            # Check for categorical color column
-            color_col = None
-            for col in df.columns:
-                if any(term in col.lower() for term in ['specialty', 'region', 'level', 'category']):
-                    color_col = col
-                    break
-            
-            fig = px.scatter(
-                df,
-                x=x_col,
-                y=y_col,
-                color=color_col,
-                size=y_col if df[y_col].dtype in ['int64', 'float64'] else None,
-                hover_data=df.columns.tolist(),
-                title=f"Impact of {x_col} on {y_col}",
-                labels={x_col: x_col.replace('_', ' ').title(), 
-                       y_col: y_col.replace('_', ' ').title()},
-                template="plotly_white"
-            )
-            
-            # Add trendline
-            if df[x_col].dtype in ['int64', 'float64'] and df[y_col].dtype in ['int64', 'float64']:
-                fig.update_traces(marker=dict(size=12, line=dict(width=1, color='white')))
-                
-                # Calculate and add regression line
-                import numpy as np
-                z = np.polyfit(df[x_col], df[y_col], 1)
-                p = np.poly1d(z)
-                fig.add_trace(go.Scatter(
-                    x=df[x_col].sort_values(),
-                    y=p(df[x_col].sort_values()),
-                    mode='lines',
-                    name='Trend',
-                    line=dict(color='red', dash='dash', width=2)
-                ))
-            
-            return fig
+    categories = classify_query(query)
+    profile = _column_profile(df)
     
-    # Bar chart for comparisons
-    if any(keyword in query_lower for keyword in ['compare', 'comparison', 'across', 'by']):
-        # Find categorical and numeric columns
-        cat_cols = df.select_dtypes(include=['object']).columns.tolist()
-        num_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-        
-        if cat_cols and num_cols:
-            x_col = cat_cols[0]
-            # Choose the most relevant numeric column
-            y_col = num_cols[0]
-            for col in num_cols:
-                if any(term in col.lower() for term in ['vaccine', 'screening', 'total', 'count']):
-                    y_col = col
-                    break
-            
-            fig = px.bar(
-                df,
-                x=x_col,
-                y=y_col,
-                color=x_col,
-                title=f"{y_col.replace('_', ' ').title()} by {x_col.replace('_', ' ').title()}",
-                labels={x_col: x_col.replace('_', ' ').title(),
-                       y_col: y_col.replace('_', ' ').title()},
-                template="plotly_white"
-            )
-            fig.update_layout(showlegend=False)
-            return fig
-    
-    # Line chart for trends over time
-    if any(keyword in query_lower for keyword in ['trend', 'over time', 'monthly', 'quarterly']):
-        time_cols = [col for col in df.columns if any(
-            term in col.lower() for term in ['month', 'quarter', 'year', 'date', 'time']
-        )]
-        
-        if time_cols:
-            x_col = time_cols[0]
-            num_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-            
-            # Create multi-line chart for key metrics
-            fig = go.Figure()
-            
-            for col in num_cols[:3]:  # Limit to 3 metrics for readability
-                fig.add_trace(go.Scatter(
-                    x=df[x_col],
-                    y=df[col],
-                    mode='lines+markers',
-                    name=col.replace('_', ' ').title(),
-                    line=dict(width=3),
-                    marker=dict(size=8)
-                ))
-            
-            fig.update_layout(
-                title="Trends Over Time",
-                xaxis_title=x_col.replace('_', ' ').title(),
-                yaxis_title="Value",
-                template="plotly_white",
-                hovermode='x unified'
-            )
-            
-            return fig
-    
-    # Default: Create a simple bar chart with first categorical and numeric columns
-    cat_cols = df.select_dtypes(include=['object']).columns.tolist()
-    num_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-    
-    if cat_cols and num_cols:
-        fig = px.bar(
-            df,
-            x=cat_cols[0],
-            y=num_cols[0],
-            title=f"Analysis Results",
-            template="plotly_white"
-        )
-        return fig
+    # Dispatch to the builders for the matched categories
+    for category, builder in CHART_BUILDERS.items():
+        if category in categories:
+            fig = builder(df, profile)
+            if fig is not None:
+                return fig
     
-    # If all else fails, create a simple table visualization
-    return None
+    return _build_default(df, profile)
 
-def get_summary_metrics() -> dict:
-    """Get high-level summary metrics for dashboard"""
+@st.cache_data(ttl=300, show_spinner=False)
+def _get_summary_metrics_cached() -> dict:
+    """Fetch summary metrics from Snowflake, cached so reruns skip the query"""
     session = get_session()
     
+    # Get key metrics
+    metrics = session.sql("""
+        SELECT 
+            COUNT(DISTINCT PROVIDER_NPI) AS total_providers,
+            SUM(TOTAL_INTERACTIONS) AS total_interactions,
+            ROUND(AVG(AVG_SCROLL_DEPTH_PCT), 1) AS avg_scroll_depth,
+            SUM(VACCINES_ADMINISTERED) AS total_vaccines,
+            SUM(SCREENINGS_COMPLETED) AS total_screenings,
+            ROUND(AVG(APPOINTMENT_SHOW_RATE) * 100, 1) AS avg_show_rate
+        FROM V_IMPACT_ANALYSIS
+    """).collect()[0]
+    
+    return {
+        'total_providers': metrics['TOTAL_PROVIDERS'],
+        'total_interactions': metrics['TOTAL_INTERACTIONS'],
+        'avg_scroll_depth': metrics['AVG_SCROLL_DEPTH'],
+        'total_vaccines': metrics['TOTAL_VACCINES'],
+        'total_screenings': metrics['TOTAL_SCREENINGS'],
+        'avg_show_rate': metrics['AVG_SHOW_RATE']
+    }
+
+def get_summary_metrics() -> dict:
+    """Get high-level summary metrics for dashboard"""
     try:
-        # Get key metrics
-        metrics = session.sql("""
-            SELECT 
-                COUNT(DISTINCT PROVIDER_NPI) AS total_providers,
-                SUM(TOTAL_INTERACTIONS) AS total_interactions,
-                ROUND(AVG(AVG_SCROLL_DEPTH_PCT), 1) AS avg_scroll_depth,
-                SUM(VACCINES_ADMINISTERED) AS total_vaccines,
-                SUM(SCREENINGS_COMPLETED) AS total_screenings,
-                ROUND(AVG(APPOINTMENT_SHOW_RATE) * 100, 1) AS avg_show_rate
-            FROM V_IMPACT_ANALYSIS
-        """).collect()[0]
-        
-        return {
-            'total_providers': metrics['TOTAL_PROVIDERS'],
-            'total_interactions': metrics['TOTAL_INTERACTIONS'],
-            'avg_scroll_depth': metrics['AVG_SCROLL_DEPTH'],
-            'total_vaccines': metrics['TOTAL_VACCINES'],
-            'total_screenings': metrics['TOTAL_SCREENINGS'],
-            'avg_show_rate': metrics['AVG_SHOW_RATE']
-        }
+        return _get_summary_metrics_cached()
     except:
         return None
 
@@ -400,6 +572,8 @@ def get_summary_metrics() -> dict:
 # Main Application UI
 # ============================================================================
 
+prewarm_agent_cache()
+
 # Header
 col1, col2 = st.columns([3, 1])
 with col1:
@@ -413,7 +587,8 @@ with col2:
 # Sidebar - Summary Metrics & Sample Questions
 # ============================================================================
 
-with st.sidebar:
+def render_sidebar_metrics():
+    """Render the key metrics block in the sidebar"""
     st.header("📊 Key Metrics")
     
     metrics = get_summary_metrics()
@@ -424,27 +599,26 @@ with st.sidebar:
         st.metric("Total Vaccines", f"{metrics['total_vaccines']:,}")
         st.metric("Total Screenings", f"{metrics['total_screenings']:,}")
         st.metric("Avg Show Rate", f"{metrics['avg_show_rate']}%")
+
+def _select_question(question: str):
+    """Button callback: queue a sample question before the next rerun"""
+    st.session_state.selected_question = question
+
+with st.sidebar:
+    render_sidebar_metrics()
     
     st.markdown("---")
     
     st.header("💡 Sample Questions")
     
-    sample_questions = [
-        "Did an increase in scrolling lead to more vaccines administered?",
-        "Show the correlation between dwell time and preventative screenings",
-        "Which content topics drove the highest appointment show rates?",
-        "What is the relationship between engagement and provider churn?",
-        "Compare clinical outcomes across different medical specialties",
-        "Show me monthly trends in engagement and clinical outcomes",
-        "What outcomes do providers with high engagement achieve?",
-        "How do different regions compare in terms of engagement?",
-        "What content do we have about flu vaccines?",
-        "Find content about diabetes management"
-    ]
-    
-    for question in sample_questions:
-        if st.button(question, key=question, use_container_width=True):
-            st.session_state.selected_question = question
+    for i, question in enumerate(SAMPLE_QUESTIONS):
+        st.button(
+            question,
+            key=f"sq_{i}",
+            on_click=_select_question,
+            args=(question,),
+            use_container_width=True
+        )
 
 # ============================================================================
 # Main Chat Interface
@@ -452,28 +626,32 @@ with st.sidebar:
 
 st.header("💬 Ask Questions About Your Data")
 
+def render_history():
+    """Replay the stored chat history"""
+    for message in st.session_state.messages:
+        if message['role'] == 'user':
+            with st.chat_message("user"):
+                st.write(message['content'])
+        else:
+            with st.chat_message("assistant"):
+                st.write(message['content'])
+                
+                # Show visualization from its stored JSON spec if one was shown
+                if message.get('viz_json'):
+                    st.plotly_chart(pio.from_json(message['viz_json']), use_container_width=True)
+                
+                # Show SQL in expander
+                if 'sql' in message and message['sql']:
+                    with st.expander("📝 View Generated SQL"):
+                        st.code(message['sql'], language='sql')
+                
+                # Show data table if available
+                if message.get('table') is not None:
+                    with st.expander("📊 View Data Table"):
+                        st.dataframe(message['table'], use_container_width=True)
+
 # Display chat history
-for message in st.session_state.messages:
-    if message['role'] == 'user':
-        with st.chat_message("user"):
-            st.write(message['content'])
-    else:
-        with st.chat_message("assistant"):
-            st.write(message['content'])
-            
-            # Show visualization if available
-            if 'visualization' in message and message['visualization']:
-                st.plotly_chart(message['visualization'], use_container_width=True)
-            
-            # Show SQL in expander
-            if 'sql' in message and message['sql']:
-                with st.expander("📝 View Generated SQL"):
-                    st.code(message['sql'], language='sql')
-            
-            # Show data table if available
-            if 'data' in message and message['data'] and len(message['data']) > 0:
-                with st.expander("📊 View Data Table"):
-                    st.dataframe(pd.DataFrame(message['data']), use_container_width=True)
+render_history()
 
 # Chat input
 user_query = st.chat_input("Ask a question about engagement impact...")
@@ -483,8 +661,8 @@ if 'selected_question' in st.session_state:
     user_query = st.session_state.selected_question
     del st.session_state.selected_question
 
-# Process user input
-if user_query:
+def render_exchange(user_query: str):
+    """Answer a new question and render the exchange below the history"""
     # Add user message to chat
     st.session_state.messages.append({
         'role': 'user',
@@ -505,19 +683,13 @@ if user_query:
             answer = response.get('answer', 'Analysis completed.')
             sql = response.get('sql', '')
             data = response.get('data', [])
+            table = to_arrow_table(data) if data else None
             
             # Display answer
             st.write(answer)
             
-            # Create visualization if appropriate
-            viz = None
-            if needs_visualization(user_query, response) and data:
-                try:
-                    viz = create_visualization(user_query, data)
-                    if viz:
-                        st.plotly_chart(viz, use_container_width=True)
-                except Exception as e:
-                    st.warning(f"Could not create visualization: {str(e)}")
+            # Reserve the chart slot so SQL and data render before the figure is built
+            chart_slot = st.empty()
             
             # Show SQL
             if sql:
@@ -525,17 +697,29 @@ if user_query:
                     st.code(sql, language='sql')
             
             # Show data table
-            if data and len(data) > 0:
+            if table is not None:
                 with st.expander("📊 View Data Table"):
-                    st.dataframe(pd.DataFrame(data), use_container_width=True)
+                    st.dataframe(table, use_container_width=True)
+            
+            # Create visualization if appropriate
+            viz = None
+            df = None
+            if needs_visualization(user_query, data):
+                try:
+                    df = table.to_pandas() if isinstance(table, pa.Table) else table
+                    viz = create_visualization(user_query, df)
+                    if viz:
+                        chart_slot.plotly_chart(viz, use_container_width=True)
+                except Exception as e:
+                    chart_slot.warning(f"Could not create visualization: {str(e)}")
             
             # Add assistant message to chat
             st.session_state.messages.append({
                 'role': 'assistant',
                 'content': answer,
                 'sql': sql,
-                'data': data,
-                'visualization': viz
+                'table': table,
+                'viz_json': viz.to_json() if viz else None
             })
             
         else:
@@ -546,6 +730,10 @@ if user_query:
                 'content': error_msg
             })
 
+# Process user input
+if user_query:
+    render_exchange(user_query)
+
 # ============================================================================
 # Footer
 # ============================================================================
@@ -563,6 +751,6 @@ st.markdown("""
 with st.sidebar:
     st.markdown("---")
     if st.button("🗑️ Clear Chat History", use_container_width=True):
-        st.session_state.messages = []
+        st.session_state.messages.clear()
         st.rerun()
 